@@ -23,9 +23,11 @@
 """
 from partfinder import logtools
 import os
+import mmap
+import re
 from partfinder.util import PartitionFinderError
 import numpy as np
-from io import StringIO
+from io import BytesIO
 from itertools import chain
 
 log = logtools.get_logger()
@@ -100,20 +102,42 @@ morph_dict = {
 }
 morph_states = set(chain(*morph_dict.values()))
 
+# All of the states, and what each character expands to, for each datatype
+_state_tables = {
+    'DNA': (dna_states, dna_dict),
+    'protein': (amino_states, amino_dict),
+    'morphology': (morph_states, morph_dict),
+}
+
+# A '\r' that isn't part of a Windows '\r\n'
+_lone_cr = re.compile(br'\r(?!\n)')
+
+
 class AlignmentError(PartitionFinderError):
     pass
 
 
 class AlignmentParser(object):
+    """Read a phylip alignment from a binary stream (anything with readline)
+
+    We work on the raw bytes of each line, so the bases go straight into the
+    array without being decoded. Only the species names are decoded.
+    """
     def __init__(self, stream, valid_bases=None):
         self.stream = stream
         self.current_line = 0
         self.cur_len = 0
         self.start_base = 0
         self.end_base = 0
+        # Keep the valid bases as bytes, so the check in `bases_to_array` is
+        # a single C-level bytes.translate call per line.
+        if valid_bases is not None:
+            valid_bases = valid_bases.encode('ascii')
         self.valid_bases = valid_bases
         self.block_len = None
         self.interleave_blocks_done = 0
+        # Names we've already seen, to catch duplicates
+        self.seen_species = set()
 
         # This is the stuff we'll copy across
         self.species = []
@@ -121,25 +145,32 @@ class AlignmentParser(object):
         self.sequence_length = 0
         self.data = None
 
-    def bases_to_array(self, bases=""):
-        upper_bases = bases.upper()
+    def bases_to_array(self, bases=b""):
+        raw = bases.upper()
+        if not raw.isascii():
+            log.error("Line %d: Non-ASCII characters found in the bases.",
+                      self.current_line)
+            raise AlignmentError
+
         if self.valid_bases is not None:
-            should_be_empty = upper_bases.translate(None, self.valid_bases)
-            if should_be_empty != "":
+            # Delete all the valid ones; whatever is left is wrong
+            should_be_empty = raw.translate(None, self.valid_bases)
+            if should_be_empty:
                 log.error("Line %d: Invalid bases '%s' found.",
-                          self.current_line, should_be_empty)
+                          self.current_line, should_be_empty.decode('ascii'))
                 raise AlignmentError
 
-        # Which is faster?
-        # return array.array("B", upper_bases)
-        return np.fromstring(upper_bases, dtype='u1')
+        # frombuffer just wraps the bytes (no per-character work); the values
+        # are copied once, when they are written into the alignment array.
+        return np.frombuffer(raw, dtype='u1')
 
     def parse(self):
         # Parse the header...
         self.parse_header()
 
-        # We now know how big it is, so allocate the array.
-        self.data = np.zeros((
+        # We now know how big it is, so allocate the array. There's no need
+        # to zero it, as we check below that every site gets filled in.
+        self.data = np.empty((
             self.species_count,
             self.sequence_length
         ), 'u1')
@@ -151,6 +182,12 @@ class AlignmentParser(object):
         while self.parse_interleave_block():
             self.interleave_blocks_done += 1
 
+        if self.start_base != self.sequence_length:
+            log.error("""Phyml format error. Only found %d bases, but the
+                      header says there are %d.""",
+                      self.start_base, self.sequence_length)
+            raise AlignmentError
+
     def parse_header(self):
         while 1:
             line = self.stream.readline()
@@ -158,6 +195,7 @@ class AlignmentParser(object):
 
             if len(line) == 0:
                 log.error("Line %d, Found no data in file", self.current_line)
+                raise AlignmentError
 
             # Skip blank lines
             if len(line.strip()) == 0:
@@ -186,7 +224,7 @@ class AlignmentParser(object):
             # Mark the length we got.
             self.block_len = self.cur_len
             self.end_base = self.start_base + self.block_len
-            if self.end_base > self.sequence_length + 1:
+            if self.end_base > self.sequence_length:
                 log.error("""Line %d: More supplied than defined in the
                             header""", self.current_line)
                 raise AlignmentError
@@ -233,9 +271,15 @@ class AlignmentParser(object):
                 raise AlignmentError
 
             spec, bases = bits
+            spec = spec.decode('utf-8')
             self.cur_len = len(bases)
 
             self.check_block()
+            if spec in self.seen_species:
+                log.error("""Line %d: Species '%s' appears more than once in
+                          the alignment""", self.current_line, spec)
+                raise AlignmentError
+            self.seen_species.add(spec)
             self.species.append(spec)
 
             # Write into the array at the right position.
@@ -349,31 +393,51 @@ class Alignment(object):
             log.error("Cannot find alignment file '%s'", pth)
             raise AlignmentError
 
-        with open(pth, 'r') as stream:
-            self.parse_stream(stream)
+        with open(pth, 'rb') as fd:
+            if os.fstat(fd.fileno()).st_size == 0:
+                # You can't map an empty file; let the parser complain
+                self.parse_stream(fd)
+                return
+
+            # Map the file rather than reading it in, and parse the lines
+            # straight out of the mapping
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if mm.find(b'\r') != -1 and _lone_cr.search(mm):
+                    # Old Mac line breaks ('\r' only, maybe mixed in with
+                    # others), which readline won't split on. These are rare,
+                    # so just convert them all.
+                    self.parse(mm[:].replace(b'\r\n', b'\n')
+                                    .replace(b'\r', b'\n'))
+                else:
+                    self.parse_stream(mm)
+            finally:
+                mm.close()
 
     def parse(self, text):
-        stream = StringIO(text)
+        if isinstance(text, str):
+            text = text.encode('utf-8')
+        stream = BytesIO(text)
         self.parse_stream(stream)
 
     def write(self, pth):
-        fd = open(pth, 'w')
         log.debug("Writing phylip file '%s'", pth)
-        self.write_phylip(fd)
-        fd.close()
+        with open(pth, 'wb', buffering=1 << 20) as fd:
+            self.write_phylip(fd)
 
     def write_phylip(self, stream):
-        species_count = len(self.species)
-        stream.write("%d %d\n" % (species_count, self.sequence_length))
+        """Write the alignment in phylip format to a binary stream"""
+        species_count = self.species_count
+        assert self.data.shape == (species_count, self.sequence_length)
+        stream.write(b"%d %d\n" % (species_count, self.sequence_length))
         for i in range(species_count):
             spec = self.species[i]
-            sequence = self.data[i]
             # We use a version of phylip which can have longer species names,
-            # up to 100
-            shortened = "%s    " % (spec[:99])
-            stream.write(shortened)
-            stream.write(str(''.join(map(chr, sequence))))  # convert ascii list to string.
-            stream.write("\n")
+            # up to 100. The rows go out as raw bytes, one write per species;
+            # the file's buffer batches these up into big writes.
+            stream.write(b"".join((
+                spec[:99].encode('utf-8'), b"    ",
+                self.data[i].tobytes(), b"\n")))
 
     def check_state_probs(self, subset, cfg):
         # There's no problem if the user doesn't care about how many states
@@ -384,20 +448,16 @@ class Alignment(object):
         sub_aln = SubsetAlignment(self, subset)
 
         # 1. Get set of all states in the alignment, obs([])
-        observed_states = np.unique(sub_aln.data).tostring()
+        observed_states = np.unique(sub_aln.data).tobytes().decode('ascii')
 
         # 2. run through all states for each state, extend a set of observed
         #    states, e.g. obs.add(x)
         expanded_states = set([])
-        if cfg.datatype == 'protein':
-            all_states = amino_states
-            state_dict = amino_dict
-        elif cfg.datatype == 'DNA':
-            all_states = dna_states
-            state_dict = dna_dict
-        elif cfg.datatype == 'morphology':
-            all_states = morph_states
-            state_dict = morph_dict
+        try:
+            all_states, state_dict = _state_tables[cfg.datatype]
+        except KeyError:
+            log.error("Unknown datatype '%s', please check" % cfg.datatype)
+            raise AlignmentError
 
         for state in observed_states:
             try:
@@ -423,9 +483,17 @@ class SubsetAlignment(Alignment):
         """create an alignment for this subset"""
         Alignment.__init__(self)
 
+        columns = np.asarray(subset.columns, dtype=np.intp)
+        steps = np.diff(columns)
+        ascending = bool((steps > 0).all())
+
         # Let's do a basic check to make sure that the specified sites
-        # aren't > alignment length
-        site_max = max(subset.columns) + 1
+        # aren't > alignment length. Subset columns are normally sorted, in
+        # which case the last one is the biggest.
+        if ascending:
+            site_max = int(columns[-1]) + 1
+        else:
+            site_max = int(columns.max()) + 1
         log.debug("Max site in data_blocks: %d; max site in alignment: %d"
                   % (site_max, source.sequence_length))
         if site_max > source.sequence_length:
@@ -435,7 +503,14 @@ class SubsetAlignment(Alignment):
             raise AlignmentError
 
         self.species = source.species
-        # Pull out the columns we need using the magic of np indexing
-        self.data = source.data[:, subset.columns]
-        self.sequence_length = len(subset.columns)
-        assert self.sequence_length == self.data.shape[1]
+        # Pull out the columns we need. Subsets are often one contiguous
+        # block of sites, or evenly spaced ones (e.g. codon positions), which
+        # we can take as a (strided) slice -- a view, no copying. Anything
+        # else is a single gather across all species at once.
+        if len(steps) and ascending and (steps == steps[0]).all():
+            step = int(steps[0])
+            self.data = source.data[:, columns[0]:columns[-1] + 1:step]
+        else:
+            self.data = np.take(source.data, columns, axis=1)
+        self.sequence_length = self.data.shape[1]
+        assert self.sequence_length == len(columns)
@@ -170,50 +170,62 @@ class PhymlResult(DataRecord):
     pass
 
 
+def _build_grammar():
+    FLOAT = Word(nums + '.-').setParseAction(lambda x: float(x[0]))
+    INTEGER = Word(nums + '-').setParseAction(lambda x: int(x[0]))
+
+    OB = Suppress("(")
+    CB = Suppress(")")
+    LNL_LABEL = Literal("Log-likelihood:")
+    TREE_SIZE_LABEL = Literal("Tree size:")
+    TIME_LABEL = Literal("Time used:")
+    HMS = Word(nums + "hms")  # A bit rough...
+
+    # The labels are suppressed and nothing is named, so the result is just
+    # the four values in order: lnl, tree size, time used, seconds
+    lnl = (Suppress(LNL_LABEL) + FLOAT)
+    tree_size = (Suppress(TREE_SIZE_LABEL) + FLOAT)
+    time = (Suppress(TIME_LABEL) + HMS + OB + INTEGER +
+            Suppress("seconds") + CB)
+
+    # Shorthand...
+    def nextbit(label, val):
+        return Suppress(SkipTo(label)) + val
+
+    # Just look for these things
+    return \
+        nextbit(LNL_LABEL, lnl) +\
+        nextbit(TREE_SIZE_LABEL, tree_size) +\
+        nextbit(TIME_LABEL, time)
+
+
 class Parser(object):
+    # The grammar holds no per-parse state, so we build it once and share it.
+    # A new Parser is made for every output file we read (see `parse` below).
+    # NB: we deliberately don't turn on pyparsing's packrat caching; it is
+    # global, and this grammar just skips forward without backtracking.
+    root_parser = _build_grammar()
+
     def __init__(self, cfg):
         self.cfg = cfg
-        FLOAT = Word(nums + '.-').setParseAction(lambda x: float(x[0]))
-        INTEGER = Word(nums + '-').setParseAction(lambda x: int(x[0]))
-
-        OB = Suppress("(")
-        CB = Suppress(")")
-        LNL_LABEL = Literal("Log-likelihood:")
-        TREE_SIZE_LABEL = Literal("Tree size:")
-        TIME_LABEL = Literal("Time used:")
-        HMS = Word(nums + "hms")  # A bit rough...
-
-        lnl = (LNL_LABEL + FLOAT("lnl"))
-        tree_size = (TREE_SIZE_LABEL + FLOAT("tree_size"))
-        time = (TIME_LABEL + HMS(
-            "time") + OB + INTEGER("seconds") + Suppress("seconds") + CB)
-
-        # Shorthand...
-        def nextbit(label, val):
-            return Suppress(SkipTo(label)) + val
-
-        # Just look for these things
-        self.root_parser = \
-            nextbit(LNL_LABEL, lnl) +\
-            nextbit(TREE_SIZE_LABEL, tree_size) +\
-            nextbit(TIME_LABEL, time)
 
     def parse(self, text):
         log.debug("Parsing phyml output...")
         try:
-            tokens = self.root_parser.parseString(text.decode("utf-8"))
+            lnl, tree_size, time_used, seconds = \
+                self.root_parser.parseString(text.decode("utf-8"))
         except ParseException as p:
             log.error(str(p))
             raise util.ParseError
 
-        log.debug("Parsed LNL:      %s" % tokens.lnl)
-        log.debug("Parsed TREESIZE: %s" % tokens.tree_size)
-        log.debug("Parsed TIME:     %s" % tokens.time)
+        log.debug("Parsed LNL:      %s" % lnl)
+        log.debug("Parsed TREESIZE: %s" % tree_size)
+        log.debug("Parsed TIME:     %s" % time_used)
 
         res = PhymlResult(self.cfg)
-        res.lnl = tokens.lnl
-        res.site_rate = tokens.tree_size
-        res.seconds = tokens.seconds
+        res.lnl = lnl
+        res.site_rate = tree_size
+        res.seconds = seconds
 
         return res
 
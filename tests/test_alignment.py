@@ -1,8 +1,10 @@
 import pytest
 import fnmatch
 import os
-from io import StringIO
-from partfinder.alignment import Alignment, SubsetAlignment, AlignmentError
+from io import BytesIO
+from partfinder.alignment import (
+    Alignment, SubsetAlignment, AlignmentError, AlignmentParser,
+    valid_nucleotide)
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 MISC_PATH = os.path.join(HERE, 'misc')
@@ -44,6 +46,25 @@ c AT
 d AC
 """
 
+DUPLICATE_SPECIES = """
+3 2
+a AT
+b AT
+a AC
+"""
+
+TOO_FEW_BASES = """
+2 4
+a AT
+b AT
+"""
+
+TOO_MANY_BASES = """
+2 4
+a ATCGA
+b ATCGA
+"""
+
 TOO_MANY_SPECIES = """
 5 2
 a AT
@@ -55,11 +76,11 @@ d AC
 
 def write_and_get_stream(align):
     # write out and read back in
-    out = StringIO()
+    out = BytesIO()
     align.write_phylip(out)
-    str_output = out.getvalue()
+    output = out.getvalue()
     del out
-    return str_output
+    return output
 
 
 def test_simple():
@@ -76,6 +97,45 @@ def test_simple():
     assert a.species == b.species
 
 
+def test_same_as():
+    a = Alignment()
+    a.parse(BASIC)
+    b = Alignment()
+    b.parse(BASIC)
+    assert a.same_as(b)
+
+    c = Alignment()
+    c.parse(BASIC.replace("spp5   acag", "spp5   acaa"))
+    assert not a.same_as(c)
+
+
+def test_read_mac_linebreaks(tmpdir):
+    pth = str(tmpdir.join('mac.phy'))
+    with open(pth, 'wb') as f:
+        f.write(INTERLEAVED.replace("\n", "\r").encode())
+    a = Alignment()
+    a.read(pth)
+    b = Alignment()
+    b.parse(INTERLEAVED)
+    assert a.species == b.species
+    assert (a.data == b.data).all()
+
+
+@pytest.mark.parametrize("text", [
+    "2 4\ra ACGT\rb ACGT\r\n",
+    "2 4\r\na ACGT\rb ACGT\r",
+    "2 4\na ACGT\r\nb ACGT\r",
+])
+def test_read_mixed_linebreaks(tmpdir, text):
+    pth = str(tmpdir.join('mixed.phy'))
+    with open(pth, 'wb') as f:
+        f.write(text.encode())
+    a = Alignment()
+    a.read(pth)
+    assert a.species == ['a', 'b']
+    assert a.data.tobytes() == b'ACGTACGT'
+
+
 def test_interleaved():
     a = Alignment()
     a.parse(INTERLEAVED)
@@ -98,6 +158,46 @@ def test_too_many_species(caplog):
     assert ("Phyml format error" in caplog.text)
 
 
+def test_too_few_bases(caplog):
+    a = Alignment()
+    with pytest.raises(AlignmentError):
+        a.parse(TOO_FEW_BASES)
+    assert ("Only found 2 bases" in caplog.text)
+
+
+def test_too_many_bases(caplog):
+    a = Alignment()
+    with pytest.raises(AlignmentError):
+        a.parse(TOO_MANY_BASES)
+    assert ("More supplied than defined" in caplog.text)
+
+
+def test_duplicate_species(caplog):
+    a = Alignment()
+    with pytest.raises(AlignmentError):
+        a.parse(DUPLICATE_SPECIES)
+    assert ("Species 'a' appears more than once" in caplog.text)
+
+
+def test_empty(caplog):
+    a = Alignment()
+    with pytest.raises(AlignmentError):
+        a.parse("\n\n")
+    assert ("Found no data" in caplog.text)
+
+
+def test_valid_bases(caplog):
+    p = AlignmentParser(BytesIO(BASIC.encode()), valid_nucleotide)
+    p.parse()
+    assert p.data.shape == (5, 10)
+
+    bad = BASIC.replace("spp3   agtg", "spp3   agzg")
+    p = AlignmentParser(BytesIO(bad.encode()), valid_nucleotide)
+    with pytest.raises(AlignmentError):
+        p.parse()
+    assert ("Invalid bases 'Z'" in caplog.text)
+
+
 class FakeSubset(object):
     def __init__(self, cols):
         self.columns = cols
@@ -114,6 +214,61 @@ def test_subset():
         assert (b.data[:, i] == a.data[:, c]).all()
 
 
+def test_subset_out_of_range(caplog):
+    a = Alignment()
+    a.parse(BASIC)
+
+    with pytest.raises(AlignmentError):
+        SubsetAlignment(a, FakeSubset([2, 10, 4]))
+    assert ("Site 11 is specified" in caplog.text)
+
+
+def test_subset_contiguous():
+    a = Alignment()
+    a.parse(INTERLEAVED)
+
+    ss = FakeSubset(list(range(3, 12)))
+    b = SubsetAlignment(a, ss)
+    assert b.sequence_length == len(ss.columns)
+    assert (b.data == a.data[:, 3:12]).all()
+
+
+def test_subset_strided():
+    a = Alignment()
+    a.parse(INTERLEAVED)
+
+    # Third codon positions
+    ss = FakeSubset(list(range(2, 30, 3)))
+    b = SubsetAlignment(a, ss)
+    assert b.sequence_length == len(ss.columns)
+    assert (b.data == a.data[:, ss.columns]).all()
+
+
+class FakeConfig(object):
+    def __init__(self, datatype):
+        self.all_states = True
+        self.datatype = datatype
+
+
+def test_check_state_probs():
+    a = Alignment()
+    a.parse(INTERLEAVED)
+    cfg = FakeConfig('DNA')
+
+    # Columns 0, 1 and 2 hold all of a, c, t and g between them
+    assert not a.check_state_probs(FakeSubset([0, 1, 2]), cfg)
+    # Column 0 is only ever a or t
+    assert a.check_state_probs(FakeSubset([0]), cfg)
+
+
+def test_check_state_probs_bad_datatype(caplog):
+    a = Alignment()
+    a.parse(INTERLEAVED)
+    with pytest.raises(AlignmentError):
+        a.check_state_probs(FakeSubset([0]), FakeConfig('RNA'))
+    assert ("Unknown datatype 'RNA'" in caplog.text)
+
+
 def generate_phyml_paths():
     paths = []
     for pth in os.listdir(MISC_PATH):
@@ -0,0 +1,53 @@
+import pytest
+from partfinder import phyml, util
+from partfinder.config import Configuration
+
+STATS = b"""
+ oooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooo
+                                  ---  PhyML 20120412  ---
+ oooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooo
+
+. Sequence file : [subset.phy]
+
+. Log-likelihood: \t\t\t-1234.5
+
+. Unconstrained likelihood: \t\t-950.2
+
+. Tree size: \t\t\t\t1.23
+
+. Time used: \t\t\t\t0h0m1s (1 seconds)
+"""
+
+
+def test_parse():
+    c = Configuration().init(datatype='DNA', phylogeny_program="phyml")
+    res = phyml.parse(STATS, c)
+    assert res.lnl == -1234.5
+    assert res.site_rate == 1.23
+    assert res.seconds == 1
+
+
+def test_parse_malformed():
+    c = Configuration().init(datatype='DNA', phylogeny_program="phyml")
+    with pytest.raises(util.ParseError):
+        phyml.parse(STATS.replace(b"Tree size:", b"Tree:"), c)
+
+
+def test_shared_grammar_keeps_no_state():
+    c = Configuration().init(datatype='DNA', phylogeny_program="phyml")
+    other = (STATS.replace(b"-1234.5", b"-99.25")
+                  .replace(b"1.23", b"0.5")
+                  .replace(b"0h0m1s (1 seconds)", b"0h1m2s (62 seconds)"))
+
+    p1 = phyml.Parser(c)
+    p2 = phyml.Parser(c)
+    assert p1.root_parser is p2.root_parser
+
+    res1 = p1.parse(STATS)
+    res2 = p2.parse(other)
+    assert (res1.lnl, res1.site_rate, res1.seconds) == (-1234.5, 1.23, 1)
+    assert (res2.lnl, res2.site_rate, res2.seconds) == (-99.25, 0.5, 62)
+
+    # And the module level helper, which makes a new Parser each time
+    res3 = phyml.parse(STATS, c)
+    assert (res3.lnl, res3.site_rate, res3.seconds) == (-1234.5, 1.23, 1)